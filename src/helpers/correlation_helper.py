@@ -0,0 +1,223 @@
+import math
+import warnings
+import numpy as np
+import pandas as pd
+import helpers.data_helper as dh
+import helpers.log_helper as lh
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from enums.Regulation import Regulation
+
+
+# Correlation matrices that have already been calculated, keyed by dataset version and bootstrap settings.
+# Kept at module level so that every session served by the same process can reuse them.
+correlation_cache = {}
+
+
+def get_correlation_matrix(df: pd.DataFrame, column_names: list, n_resamples: int = 1000, confidence_level: float = 0.95,
+    batch_size: int = 100, workers: int = 1, seed: int = 0) -> pd.DataFrame:
+    '''
+    Calculates Pearson and Spearman correlation coefficients for every pair of the supplied columns, along with
+    percentile bootstrap confidence intervals. Results are cached by dataset version, so repeated calls with
+    unchanged data return immediately.
+
+    Parameters
+    ---
+    `df` : `DataFrame` object
+    `column_names` : `list` of `str` representing the columns to be correlated with each other
+    `n_resamples` : `int` number of bootstrap resamples
+    `confidence_level` : `float` representing the confidence level of the intervals, between 0 and 1
+    `batch_size` : `int` number of resamples evaluated together in one vectorized batch
+    `workers` : `int` number of processes the batches are split across. Batches are evaluated in this process if 1.
+    `seed` : `int` seed used to draw the resample indices
+
+    Returns
+    ---
+    `DataFrame` with one row for every (x, y) combination of `column_names`.
+    '''
+    relevant_df = df[column_names]
+    cache_key = (dh.get_dataset_version(relevant_df), n_resamples, confidence_level, seed)
+
+    if cache_key in correlation_cache:
+        lh.log_info('Using cached correlation matrix.')
+        return correlation_cache[cache_key]
+
+    correlation_start = lh.start_timed_log(f'Calculating correlation matrix with {n_resamples} bootstrap resamples.')
+
+    # Treat missing regulation scores the same way as data that could not be found.
+    values = relevant_df.replace(Regulation.NO_DATA.value, np.nan).to_numpy(dtype=float)
+    row_count = values.shape[0]
+
+    # Every resample draws countries with replacement. All pairs of columns share the same resamples.
+    resample_indices = np.random.default_rng(seed).integers(0, row_count, size=(n_resamples, row_count))
+    batches = np.array_split(resample_indices, math.ceil(n_resamples / batch_size))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(calculate_correlations, repeat(values), batches))
+    else:
+        results = [calculate_correlations(values, batch) for batch in batches]
+
+    pearson, spearman = calculate_correlations(values, np.arange(row_count)[np.newaxis, :])
+    pearson_bounds = get_confidence_bounds(np.concatenate([result[0] for result in results]), confidence_level)
+    spearman_bounds = get_confidence_bounds(np.concatenate([result[1] for result in results]), confidence_level)
+
+    # Number of countries with data for both columns of each pair.
+    present = (~np.isnan(values)).astype(int)
+    counts = present.T @ present
+
+    matrices = {
+        'pearson': to_square_matrix(pearson[0]),
+        'pearson_lower': to_square_matrix(pearson_bounds[0]),
+        'pearson_upper': to_square_matrix(pearson_bounds[1]),
+        'spearman': to_square_matrix(spearman[0]),
+        'spearman_lower': to_square_matrix(spearman_bounds[0]),
+        'spearman_upper': to_square_matrix(spearman_bounds[1])
+    }
+
+    correlation_df = pd.DataFrame([{
+        'x': x_column_name,
+        'y': y_column_name,
+        **{name: matrix[x_index, y_index] for name, matrix in matrices.items()},
+        'count': counts[x_index, y_index]
+    } for x_index, x_column_name in enumerate(column_names) for y_index, y_column_name in enumerate(column_names)])
+
+    correlation_cache[cache_key] = correlation_df
+    lh.stop_timed_log('Finished calculating correlation matrix.', correlation_start)
+
+    return correlation_df
+
+
+def calculate_correlations(values: np.ndarray, resample_indices: np.ndarray) -> tuple:
+    '''
+    Calculates Pearson and Spearman correlation coefficients for every pair of columns in `values`, for a batch
+    of resamples at once. Countries missing data for either column of a pair are left out of that pair only.
+
+    Parameters
+    ---
+    `values` : `ndarray` of shape (countries, columns), containing `nan` where data could not be found
+    `resample_indices` : `ndarray` of shape (resamples, countries) representing the rows drawn in each resample
+
+    Returns
+    ---
+    `tuple` of Pearson and Spearman coefficients, each an `ndarray` of shape (resamples, pairs), where pairs
+    are ordered as in `np.triu_indices`.
+    '''
+    first_indices, second_indices = np.triu_indices(values.shape[1], k=1)
+
+    # Shape (resamples, countries, pairs).
+    resampled = values[resample_indices]
+    x = resampled[:, :, first_indices]
+    y = resampled[:, :, second_indices]
+    valid = ~np.isnan(x) & ~np.isnan(y)
+
+    # Invalid values are ranked after all valid ones, so they do not affect the ranks within each pair.
+    x_ranks = get_average_ranks(np.where(valid, x, np.inf))
+    y_ranks = get_average_ranks(np.where(valid, y, np.inf))
+
+    return calculate_pearson(x, y, valid), calculate_pearson(x_ranks, y_ranks, valid)
+
+
+def calculate_pearson(x: np.ndarray, y: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    '''
+    Calculates Pearson correlation coefficients along the country axis.
+
+    Parameters
+    ---
+    `x` : `ndarray` of shape (resamples, countries, pairs)
+    `y` : `ndarray` of shape (resamples, countries, pairs)
+    `valid` : `ndarray` of `bool` indicating which values of `x` and `y` should be included
+
+    Returns
+    ---
+    `ndarray` of shape (resamples, pairs). Contains `nan` where fewer than three countries are valid or either
+    column is constant.
+    '''
+    count = valid.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(valid, x, 0).sum(axis=1) / count
+        y_mean = np.where(valid, y, 0).sum(axis=1) / count
+        x_deviation = np.where(valid, x - x_mean[:, np.newaxis, :], 0)
+        y_deviation = np.where(valid, y - y_mean[:, np.newaxis, :], 0)
+
+        covariance = (x_deviation * y_deviation).sum(axis=1)
+        r = covariance / np.sqrt((x_deviation ** 2).sum(axis=1) * (y_deviation ** 2).sum(axis=1))
+
+    r[count < 3] = np.nan
+
+    return np.clip(r, -1, 1)
+
+
+def get_average_ranks(values: np.ndarray) -> np.ndarray:
+    '''
+    Ranks values along the country axis, assigning tied values the average of their ranks.
+
+    Parameters
+    ---
+    `values` : `ndarray` of shape (resamples, countries, pairs)
+
+    Returns
+    ---
+    `ndarray` of ranks with the same shape as `values`, starting at 1.
+    '''
+    resample_count, row_count, pair_count = values.shape
+    rows = np.moveaxis(values, 1, -1).reshape(-1, row_count)
+
+    order = np.argsort(rows, axis=1, kind='stable')
+    sorted_rows = np.take_along_axis(rows, order, axis=1)
+
+    # Number each run of tied values. Every row starts a new run, so the numbers are unique across rows.
+    is_new_value = np.ones(sorted_rows.shape, dtype=bool)
+    is_new_value[:, 1:] = sorted_rows[:, 1:] != sorted_rows[:, :-1]
+    groups = np.cumsum(is_new_value).reshape(sorted_rows.shape) - 1
+
+    positions = np.broadcast_to(np.arange(1, row_count + 1), sorted_rows.shape)
+    average_ranks = np.bincount(groups.ravel(), weights=positions.ravel()) / np.bincount(groups.ravel())
+
+    ranks = np.empty(rows.shape)
+    np.put_along_axis(ranks, order, average_ranks[groups], axis=1)
+
+    return np.moveaxis(ranks.reshape(resample_count, pair_count, row_count), -1, 1)
+
+
+def get_confidence_bounds(samples: np.ndarray, confidence_level: float) -> np.ndarray:
+    '''
+    Calculates percentile bootstrap confidence bounds.
+
+    Parameters
+    ---
+    `samples` : `ndarray` of shape (resamples, pairs) containing bootstrapped coefficients
+    `confidence_level` : `float` representing the confidence level of the intervals, between 0 and 1
+
+    Returns
+    ---
+    `ndarray` of shape (2, pairs) containing the lower and upper bounds.
+    '''
+    tail = (1 - confidence_level) / 2 * 100
+
+    # Pairs without enough data have no valid resamples at all.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+
+
+def to_square_matrix(pair_values: np.ndarray) -> np.ndarray:
+    '''
+    Converts values ordered as in `np.triu_indices` to a symmetric square matrix with ones on the diagonal.
+
+    Parameters
+    ---
+    `pair_values` : `ndarray` of shape (pairs,)
+
+    Returns
+    ---
+    `ndarray` of shape (columns, columns).
+    '''
+    column_count = int((1 + math.sqrt(1 + 8 * len(pair_values))) / 2)
+    matrix = np.eye(column_count)
+    first_indices, second_indices = np.triu_indices(column_count, k=1)
+    matrix[first_indices, second_indices] = pair_values
+    matrix[second_indices, first_indices] = pair_values
+
+    return matrix
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import re
 import pandas as pd
@@ -78,6 +79,25 @@ def get_cleaned_data() -> pd.DataFrame:
     return merged_df
 
 
+def get_dataset_version(df: pd.DataFrame) -> str:
+    '''
+    Calculates a hash of the supplied `DataFrame`'s column names and contents, which changes whenever the
+    underlying data does. Used to key cached results that are derived from the dataset.
+
+    Parameters
+    ---
+    `df` : `DataFrame` object
+
+    Returns
+    ---
+    `str` representing the version of the dataset.
+    '''
+    version = hashlib.sha256('|'.join(map(str, df.columns)).encode())
+    version.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+
+    return version.hexdigest()
+
+
 def get_gun_deaths_df() -> pd.DataFrame:
     '''
     Imports Small-Arms-Survey-DB-violent-deaths.xlsx and parses as a `DataFrame`.
@@ -1,10 +1,12 @@
 import numpy as np
 import pandas as pd
+import helpers.correlation_helper as ch
 import helpers.log_helper as lh
 from bokeh.layouts import column, row
 from bokeh.plotting import curdoc, figure, Figure
-from bokeh.models import ColumnDataSource, Select, Div
+from bokeh.models import ColumnDataSource, Select, Div, LinearColorMapper, ColorBar
 from bokeh.models.tools import HoverTool
+from bokeh.palettes import RdBu11
 from enums.ColumnName import REGULATION_COLUMN_NAMES, ColumnName, TEXT_COLUMN_NAMES
 
 
@@ -27,16 +29,38 @@ def initialize_bokeh(df: pd.DataFrame):
     x_select = Select(title='X-Axis Statistic', value=ColumnName.OVERALL_REGULATION.value, options=selectable_columns)
     y_select = Select(title='Y-Axis Statistic', value=ColumnName.DEATH_RATE.value, options=selectable_columns)
     highlighted_country_select = Select(title='Highlighted Country', value='United States', options=countries)
+    correlation_method_select = Select(title='Heatmap Correlation Method', value='Pearson', options=['Pearson', 'Spearman'])
 
-    controls = column(x_select, y_select, highlighted_country_select, description, width=400)
-    layout = row(controls, create_plot(df, x_select.value, y_select.value, highlighted_country_select.value))
+    correlation_df = ch.get_correlation_matrix(df, selectable_columns)
+
+    controls = column(x_select, y_select, highlighted_country_select, correlation_method_select, description, width=400)
+    plots = column(
+        create_plot(df, x_select.value, y_select.value, highlighted_country_select.value),
+        create_heatmap(correlation_df, selectable_columns, correlation_method_select.value))
+    layout = row(controls, plots)
 
     #on_change callback functions must have the signature func(attr, old, new).
     def update(attr, old, new):
         lh.log_info(f'Updating plot with the following values:\n\tX: {x_select.value}, Y: {y_select.value}, HIGHLIGHTED: {highlighted_country_select.value}')
-        layout.children[1] = create_plot(df, x_select.value, y_select.value, highlighted_country_select.value)
+        plots.children[0] = create_plot(df, x_select.value, y_select.value, highlighted_country_select.value)
+
+    # Clicking a heatmap cell plots that pair of columns in the scatter plot.
+    def select_cell(attr, old, new):
+        if not new:
+            return
+
+        cells = plots.children[1].select_one({'name': 'cells'}).data_source
+        x_select.value = cells.data['x'][new[0]]
+        y_select.value = cells.data['y'][new[0]]
+
+    def update_heatmap(attr, old, new):
+        lh.log_info(f'Updating heatmap with the following values:\n\tMETHOD: {correlation_method_select.value}')
+        plots.children[1] = create_heatmap(correlation_df, selectable_columns, correlation_method_select.value)
+        plots.children[1].select_one({'name': 'cells'}).data_source.selected.on_change('indices', select_cell)
 
     [select.on_change('value', update) for select in [x_select, y_select, highlighted_country_select]]
+    correlation_method_select.on_change('value', update_heatmap)
+    plots.children[1].select_one({'name': 'cells'}).data_source.selected.on_change('indices', select_cell)
 
     curdoc().add_root(layout)
     curdoc().title = "Gun Violence Correlations"
@@ -89,6 +113,57 @@ def create_plot(df: pd.DataFrame, x_column_name: str, y_column_name: str, highli
     return fig
     
 
+def create_heatmap(correlation_df: pd.DataFrame, column_names: list, method: str) -> Figure:
+    '''
+    Creates bokeh `Figure` object showing the correlation of every column against every other column.
+
+    Parameters
+    ---
+    `correlation_df` : `DataFrame` object returned by `get_correlation_matrix`
+    `column_names` : `list` of `str` representing the columns in the order they should appear on each axis
+    `method` : `str` representing the correlation method to color the cells by, either 'Pearson' or 'Spearman'
+
+    Returns
+    ---
+    a `Figure` object representing the correlation matrix.
+    '''
+    method_column_name = method.lower()
+
+    heatmap_df = correlation_df.copy()
+    heatmap_df['r'] = heatmap_df[method_column_name]
+    heatmap_df['label'] = heatmap_df['r'].map(lambda r: 'n/a' if pd.isna(r) else f'{r:.2f}')
+    # Dark text is hard to read on strongly colored cells.
+    heatmap_df['label_color'] = np.where(heatmap_df['r'].abs() > 0.6, 'white', '#2F2F2F')
+
+    color_mapper = LinearColorMapper(palette=list(reversed(RdBu11)), low=-1, high=1, nan_color='#444444')
+
+    heatmap_source = ColumnDataSource(heatmap_df)
+
+    fig = figure(plot_width=1000, plot_height=1000, x_range=column_names, y_range=list(reversed(column_names)),
+        tools='tap', toolbar_location=None)
+    fig.rect(x='x', y='y', width=1, height=1, source=heatmap_source,
+        fill_color={'field': 'r', 'transform': color_mapper}, line_color='#2F2F2F',
+        nonselection_fill_alpha=1, selection_line_color='white', selection_line_width=3, name='cells')
+    fig.text(x='x', y='y', text='label', source=heatmap_source, text_color={'field': 'label_color'},
+        text_align='center', text_baseline='middle', text_font_size='9pt')
+
+    fig.title.text = f'{method} Correlation Matrix (click a cell to plot it)'
+    fig.xaxis.major_label_orientation = np.pi / 3
+    fig.grid.grid_line_color = None
+    fig.add_layout(ColorBar(color_mapper=color_mapper, background_fill_color='#2F2F2F', major_label_text_color='white'), 'right')
+
+    hover_tool = HoverTool(tooltips=[
+        ('X', '@x'),
+        ('Y', '@y'),
+        ('Pearson r', '@pearson{0.00} (95% CI @pearson_lower{0.00} to @pearson_upper{0.00})'),
+        ('Spearman r', '@spearman{0.00} (95% CI @spearman_lower{0.00} to @spearman_upper{0.00})'),
+        ('Countries', '@count')
+    ], names=['cells'])
+    fig.add_tools(hover_tool)
+
+    return fig
+
+
 def create_regression_line(df: pd.DataFrame, x_column_name: str, y_column_name: str) -> list:
     '''
     Given the supplied `DataFrame`, calculates a regression line indicating the